@@ -0,0 +1,168 @@
+from lexer import Lexer
+from parser import Parser
+from codegen import generate_code
+import scan
+import argparse, json, os, platform, random, shutil, statistics, struct, subprocess, sys, tempfile, time
+
+
+MACHINES = (0x14c, 0x8664, 0x1c0, 0xaa64, 0x200)
+SUBSYSTEMS = (0, 1, 2, 3)
+
+
+def make_pe(rng):
+    pe_header_address = rng.randrange(0x40, 0x200, 8)
+    section_numbers = rng.randrange(1, 12)
+    dos_header = bytearray(rng.getrandbits(8) for _ in range(pe_header_address))
+    dos_header[0:2] = b"MZ"
+    struct.pack_into("<I", dos_header, 0x3c, pe_header_address)
+    image_header = b"PE\0\0" + struct.pack(
+        "<HHIIIHH",
+        rng.choice(MACHINES), section_numbers, rng.getrandbits(32), 0, 0, 224,
+        rng.getrandbits(16) | 0x0002,
+    )
+    optional_header = struct.pack(
+        "<HBBIIIIII",
+        0x10b, rng.randrange(16), rng.randrange(16), rng.getrandbits(20), rng.getrandbits(20),
+        0, rng.getrandbits(20), 0x1000, rng.getrandbits(20),
+    )
+    windows_fields = struct.pack(
+        "<IIIHHHHHHIIIIHHIIIIII",
+        0x400000, 0x1000, 0x200, 6, 0, 0, 0, 6, 0, 0, rng.getrandbits(24), 0x400, rng.getrandbits(32),
+        rng.choice(SUBSYSTEMS), rng.getrandbits(16) & 0xffe0,
+        0x100000, 0x1000, 0x100000, 0x1000, 0, 16,
+    )
+    data_directories = struct.pack("<32I", *(rng.getrandbits(32) for _ in range(32)))
+    sections = bytes(rng.getrandbits(8) for _ in range(40 * section_numbers))
+    padding = bytes(rng.randrange(0, 4096))
+    return bytes(dos_header) + image_header + optional_header + windows_fields + data_directories + sections + padding
+
+
+def make_corpus(directory, count, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"sample_{index:06}.exe")
+        with open(path, "wb") as doc:
+            doc.write(make_pe(rng))
+        paths.append(path)
+    return paths
+
+
+def make_spec(maps, entries, base):
+    lines = []
+    for number in range(maps):
+        lines.append(f"map GeneratedMap{number} where")
+        lines.extend(f"    | 0x{key * 7919:x} > \"GENERATED_VALUE_{number}_{key}\"" for key in range(entries))
+        lines.append("end")
+        lines.append("")
+        lines.append(f"bitflag GeneratedFlags{number} where")
+        lines.extend(f"    | 0x{1 << bit:x} > GENERATED_FLAG_{number}_{bit}" for bit in range(32))
+        lines.append("end")
+        lines.append("")
+    return "\n".join(lines) + "\n" + base
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_compiler(code):
+    tokens, lex_time = timed(lambda: list(Lexer(code).tokenize()))
+    ast, parse_time = timed(lambda: Parser(tokens).parse())
+    generated, codegen_time = timed(generate_code, ast)
+    return {
+        "tokens": len(tokens),
+        "lexer_tokens_per_second": len(tokens) / lex_time,
+        "parser_tokens_per_second": len(tokens) / parse_time,
+        "codegen_seconds": codegen_time,
+        "generated_bytes": len(generated),
+    }
+
+
+def bench_import(directory, module, repeat):
+    script = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script], cwd=directory, check=True, capture_output=True, text=True)
+        times.append(float(output.stdout))
+    return {"median_seconds": statistics.median(times), "min_seconds": min(times)}
+
+
+def bench_parse(module, paths, **kwargs):
+    times = []
+    for path in paths:
+        start = time.perf_counter()
+        module.parse(path, **kwargs)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "files": len(times),
+        "median_seconds": statistics.median(times),
+        "p99_seconds": times[min(len(times) - 1, int(len(times) * 0.99))],
+        "files_per_second": len(times) / sum(times),
+    }
+
+
+def bench_scan(format_path, directory, jobs):
+    start = time.perf_counter()
+    records = sum(1 for _ in scan.scan(format_path, [directory], jobs))
+    elapsed = time.perf_counter() - start
+    return {"files": records, "jobs": jobs, "seconds": elapsed, "files_per_second": records / elapsed}
+
+
+def git_revision():
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compiler and the generated readers.")
+    parser.add_argument("-f", "--format", default="formats/pe_file_format", help="format to benchmark (default: formats/pe_file_format)")
+    parser.add_argument("-n", "--files", type=int, default=2000, help="number of synthetic files (default: 2000)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="workers for the batch scan")
+    parser.add_argument("--maps", type=int, default=200, help="maps in the oversized spec (default: 200)")
+    parser.add_argument("--entries", type=int, default=100, help="entries per map in the oversized spec (default: 100)")
+    parser.add_argument("--imports", type=int, default=10, help="number of timed imports (default: 10)")
+    parser.add_argument("--corpus", help="keep the synthetic corpus in this directory")
+    parser.add_argument("-o", "--output", help="JSON output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    with open(args.format) as doc:
+        base = doc.read()
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "compiler": bench_compiler(make_spec(args.maps, args.entries, base)),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.basename(args.format)
+        format_path = os.path.join(directory, f"{name}.py")
+        with open(format_path, "w") as doc:
+            doc.write(generate_code(Parser(Lexer(base).tokenize()).parse()))
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtime.py"), os.path.join(directory, "runtime.py"))
+        results["import"] = bench_import(directory, name, args.imports)
+        module = scan.load_format(format_path)
+
+        corpus = args.corpus or os.path.join(directory, "corpus")
+        os.makedirs(corpus, exist_ok=True)
+        paths = make_corpus(corpus, args.files)
+        results["parse"] = bench_parse(module, paths)
+        results["parse_mmap"] = bench_parse(module, paths, mmap=True)
+        results["scan"] = bench_scan(format_path, corpus, args.jobs)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as doc:
+            doc.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
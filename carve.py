@@ -0,0 +1,98 @@
+from concurrent.futures import ProcessPoolExecutor
+from scan import load_format, flatten, WRITERS
+import argparse, mmap, os, sys
+
+
+def find_offsets(buffer, magic, start=0, end=None):
+    value, offset = magic
+    end = len(buffer) if end is None else end
+    stop = min(end + offset + len(value) - 1, len(buffer))
+    position = buffer.find(value, start + offset, stop)
+    while position != -1:
+        yield position - offset
+        position = buffer.find(value, position + 1, stop)
+
+
+def carve_buffer(module, buffer, start=0, end=None, eager=False):
+    if module.MAGIC[0] is None:
+        raise ValueError("this format has no magic declaration")
+    view = memoryview(buffer)
+    for offset in find_offsets(buffer, module.MAGIC, start, end):
+        try:
+            result = module.parse_bytes(view[offset:], eager)
+        except Exception:
+            continue
+        yield offset, result
+
+
+def open_map(path):
+    with open(path, "rb") as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""
+
+
+_module = None
+_raw = False
+
+def _init_worker(format_path, raw):
+    global _module, _raw
+    _module = load_format(format_path)
+    _raw = raw
+
+def _carve_chunk(path, start, end):
+    buffer = open_map(path)
+    records = [{"path": path, "offset": offset, **flatten(_module, result, _raw)} for offset, result in carve_buffer(_module, buffer, start, end)]
+    if isinstance(buffer, mmap.mmap):
+        buffer.close()
+    return records
+
+
+def carve(format_path, path, jobs=None, chunksize=64 << 20, raw=False):
+    module = load_format(format_path)
+    if module.MAGIC[0] is None:
+        raise ValueError(f"{format_path} has no magic declaration")
+    size = os.path.getsize(path)
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(format_path, raw)) as pool:
+        pending = []
+        for start in range(0, size, chunksize):
+            pending.append(pool.submit(_carve_chunk, path, start, min(start + chunksize, size)))
+            while len(pending) >= 2 * jobs:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find and parse every occurrence of a compiled format inside a big file.")
+    parser.add_argument("format", help="compiled format with a magic declaration, like out/pe_file_format.py")
+    parser.add_argument("path", help="file to carve, like a disk or memory image")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-f", "--output-format", choices=WRITERS, help="jsonl or csv (default: from the output extension, else jsonl)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: number of cores)")
+    parser.add_argument("--chunksize", type=int, default=64 << 20, help="bytes searched by a worker at once (default: 64 MiB)")
+    parser.add_argument("--raw", action="store_true", help="write raw integers instead of decoded values")
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format
+    if output_format is None:
+        extension = os.path.splitext(args.output or "")[1].lstrip(".")
+        output_format = extension if extension in WRITERS else "jsonl"
+    module = load_format(args.format)
+    stream = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = WRITERS[output_format](stream, module, ("path", "offset"))
+        total = 0
+        for record in carve(args.format, args.path, args.jobs, args.chunksize, args.raw):
+            writer.write(record)
+            total += 1
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    print(f"{total} records carved", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
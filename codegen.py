@@ -1,131 +1,25 @@
-from ast import *
+from nodes import *
+import keyword
+import runtime
 
 
 BASE_CODE = """
 import sys
 
-FILE = sys.argv[1]
-reader = open(FILE, "rb")
-
-
-def _runtime_lookup(name):
-    try:
-        return _func_wrapper(getattr(MAPS, name).__getitem__)
-    except AttributeError:
-        pass
-    try:
-        return _func_wrapper(getattr(BITFLAGS, name).get)
-    except AttributeError:
-        print(f"No such map or bitflag {name}")
-        sys.exit(0)
-
-
-def _func_wrapper(func):
-    def inner_wrapper(self, *args, **kwargs):
-        return func(*args, **kwargs)
-    return inner_wrapper
-
-_int = _func_wrapper(int)
-_hex = _func_wrapper(hex)
-_bin = _func_wrapper(bin)
-
-
-def _to_bytes(rule, value):
-    return int.to_bytes(value, rule.to_read, "little")
-
-def _str(rule, value):
-    return _to_bytes(rule, value).decode("ascii")
-
-
-class Symbol:
-    __symbols__ = {}
-    def __new__(cls, value):
-        if value in cls.__symbols__:
-            return cls.__symbols__[value]
-        obj = object.__new__(cls)
-        cls.__symbols__[value] = obj
-        return obj
-    def __init__(self, value):
-        self.value = value
-    def __repr__(self):
-        return self.value
-    def __eq__(self, other):
-        return self is other
-
-
-class Flag:
-    def __init__(self, number, *symbols):
-        self.number = number
-        self.symbols = symbols
-    def __or__(self, other):
-        return Flag(self.number | other.number, *self.symbols, *other.symbols)
-    def __int__(self):
-        return self.number
-    def __repr__(self):
-        return " | ".join(str(symbol) for symbol in self.symbols)
-
-
-class Bitflag:
-    def __init_subclass__(cls):
-        cls.__members__ = [item[0] for item in vars(cls).items() if isinstance(item[1], Flag)]
-    @classmethod
-    def get(cls, value):
-        result = None
-        for member in cls.__members__:
-            flag = getattr(cls, member)
-            if int(flag) & value != 0:
-                result = flag if result is None else result | flag
-        return result
-
-
-class Attribute:
-    def __init__(self, value, changed_value):
-        self.value = value
-        self.changed_value = changed_value
-
-    def __int__(self):
-        return self.value
-
-    def __repr__(self):
-        return str(self.changed_value)
-
-
-class ReaderRule:
-    def __init__(self, to_read, as_rule):
-        self.to_read = to_read
-        self.as_rule = as_rule
-        self.name = None
-
-    def __get__(self, instance, owner):
-        if instance is not None:
-            value = getattr(instance, self.name)
-            return Attribute(value, self.as_rule(self, value))
-        else:
-            return self
-
-    def __set_name__(self, cls, name):
-        self.name = f"_{name}"
-
-
-class Reader:
-    def __init_subclass__(cls):
-        cls.__members__ = [item[0] for item in vars(cls).items() if isinstance(item[1], ReaderRule)]
-
-    @classmethod
-    def read(cls, stream):
-        reader = cls()
-        for name in cls.__members__:
-            new_name = f"_{name}"
-            to_read = getattr(cls, name).to_read
-            value = int.from_bytes(stream.read(to_read), "little")
-            setattr(reader, new_name, value)
-        return reader
+from runtime import (
+    MemoryStream, ForwardStream, PositionalStream, AsyncStream, CachedStream, open_source, seekable,
+    Result, LazyResult, Projection, Program, Rejected, Truncated,
+    Symbol, Flag, Bitflag, Map, DenseMap, Attribute, ReaderRule, ReaderArray, Reader,
+    _int, _hex, _bin, _to_bytes, _str,
+)
 """
 
 
 BASE_TABLES_CODE = "\n\nclass MAPS:"
 TABLE_ENTRY_CODE = """
-    {name} = {table}"""
+    {name} = Map({table})"""
+DENSE_TABLE_ENTRY_CODE = """
+    {name} = DenseMap({table})"""
 
 BASE_BITFLAGS_CODE = "\n\nclass BITFLAGS:"
 BITFLAG_CODE = """
@@ -135,21 +29,220 @@ BITFLAG_ENTRY_CODE = """
 
 BASE_READER_CODE = "\n\nclass READERS:"
 READER_CODE = """
-    class {name}(Reader):"""
+    class {name}({base}):
+        __layout__ = "{layout}"
+        __slots__ = ({slots}){expect}
+
+        def __init__(self{arguments}):{assignments}
+            self._cache = None
+
+        def to_tuple(self):
+            return ({values})
+"""
+READER_ASSIGNMENT_CODE = """
+            self._{name} = {name}"""
 READER_ENTRY_CODE = """
         {name} = ReaderRule({to_read}, {as_rule})"""
 
+PARSE_CODE = """
+PROGRAM = {program}(({steps}
+))
+
+
+def parse_stream(stream, eager=False, fields=None, lazy=False):
+    if not seekable(stream):
+        if lazy:
+            raise ValueError("lazy parsing needs a seekable stream")
+        stream = ForwardStream(stream){wrap_stream}
+    if lazy:
+        return LazyResult(stream, PROGRAM, eager)
+    if fields is not None:
+        return PROGRAM.run(stream, fields, eager)
+    result = Result(){instructions}
+    return result
+
+
+async def parse_async(source, eager=False, fields=None):
+    stream = AsyncStream(source){wrap_async_stream}
+    if fields is not None:
+        return await PROGRAM.run_async(stream, fields, eager)
+    result = Result(){async_instructions}
+    return result
+
+
+def parse_bytes(buffer, eager=False, fields=None, lazy=False):
+    return parse_stream(MemoryStream(buffer), eager, fields, lazy)
+
+
+def parse_fd(fd, offset=0, eager=False, fields=None, lazy=False):
+    return parse_stream(PositionalStream(fd, offset), eager, fields, lazy)
+
+
+def parse(path, mmap=False, eager=False, fields=None, lazy=False):
+    if mmap:
+        return parse_stream(MemoryStream.map(path), eager, fields, lazy)
+    if lazy:
+        return parse_stream(open_source(path), eager, fields, lazy)
+    with open_source(path) as stream:
+        return parse_stream(stream, eager, fields)
+
+
+if __name__ == "__main__":
+    if sys.argv[-1] == "-":
+        globals().update(vars(parse_stream(sys.stdin.buffer)))
+    else:
+        globals().update(vars(parse(sys.argv[-1], mmap="--mmap" in sys.argv[1:-1])))
+"""
+
+INSTRUMENT_CODE = """
+
+import json
+import time
+
+_STATS = {}
+
+
+def _record(name, wall, cpu, size=0, seeks=0):
+    counter = _STATS.get(name)
+    if counter is None:
+        counter = _STATS[name] = {"calls": 0, "bytes": 0, "seeks": 0, "wall": 0.0, "cpu": 0.0}
+    counter["calls"] += 1
+    counter["bytes"] += size
+    counter["seeks"] += seeks
+    counter["wall"] += time.perf_counter() - wall
+    counter["cpu"] += time.process_time() - cpu
+
+
+def _probe(stream):
+    return time.perf_counter(), time.process_time(), stream.bytes, stream.seeks
+
+
+def _record_instruction(name, probe, stream):
+    wall, cpu, size, seeks = probe
+    _record(name, wall, cpu, stream.bytes - size, stream.seeks - seeks)
+
+
+def _timed(name, as_rule):
+    def timed_rule(rule, value):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = as_rule(rule, value)
+        _record(name, wall, cpu)
+        return result
+    return timed_rule
+
+
+def stats():
+    return {name: dict(counter) for name, counter in _STATS.items()}
+
+
+def reset_stats():
+    _STATS.clear()
+
+
+def dump_stats(file):
+    if isinstance(file, str):
+        with open(file, "w") as doc:
+            json.dump(stats(), doc, indent=4)
+    else:
+        json.dump(stats(), file, indent=4)
+
+
+class InstrumentedStream:
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+        self.seeks = 0
+
+    def read(self, size):
+        data = self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        self.seeks += 1
+        return self.stream.seek(offset, whence)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class AsyncInstrumentedStream(InstrumentedStream):
+    async def read(self, size):
+        data = await self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+    async def seek(self, offset, whence=0):
+        self.seeks += 1
+        return await self.stream.seek(offset, whence)
+
+
+class InstrumentedReader(Reader):
+    __slots__ = ()
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0, eager=False):
+        wall, cpu = time.perf_counter(), time.process_time()
+        reader = super().from_buffer(buffer, offset, eager)
+        _record(f"reader {cls.__name__}", wall, cpu, cls.__struct__.size)
+        return reader
+
+    @classmethod
+    def from_projection(cls, buffer, projection, eager=False):
+        wall, cpu = time.perf_counter(), time.process_time()
+        reader = super().from_projection(buffer, projection, eager)
+        _record(f"reader {cls.__name__}", wall, cpu, projection.struct.size)
+        return reader
+
+    @classmethod
+    def array_from_buffer(cls, buffer, count):
+        wall, cpu = time.perf_counter(), time.process_time()
+        array = super().array_from_buffer(buffer, count)
+        _record(f"reader {cls.__name__}", wall, cpu, cls.__struct__.size * count)
+        return array
+
+
+class InstrumentedProgram(Program):
+    def execute(self, stream, result, step, eager):
+        probe = _probe(stream)
+        super().execute(stream, result, step, eager)
+        _record_instruction(self.label(step), probe, stream)
+
+    async def execute_async(self, stream, result, step, eager):
+        probe = _probe(stream)
+        await super().execute_async(stream, result, step, eager)
+        _record_instruction(self.label(step), probe, stream)
+"""
+WRAP_STREAM_CODE = """
+    stream = InstrumentedStream(stream)"""
+WRAP_ASYNC_STREAM_CODE = """
+    stream = AsyncInstrumentedStream(stream)"""
+PROBE_CODE = """
+    probe = _probe(stream)"""
+RECORD_CODE = """
+    _record_instruction({label!r}, probe, stream)"""
+
+STEP_CODE = """
+    ("{kind}", {target}, {argument}),"""
 READ_INSTRUCTION = """
-{reader_name} = getattr(READERS, '{reader_name}').read(reader)"""
+    result.{reader_name} = {await_}getattr(READERS, '{reader_name}').read{suffix}(stream, eager)"""
+RANGE_READ_INSTRUCTION = """
+    buffer = {await_}stream.read({size})"""
+BUFFER_READ_INSTRUCTION = """
+    result.{reader_name} = getattr(READERS, '{reader_name}').from_buffer(buffer, {offset}, eager)"""
+READ_ARRAY_INSTRUCTION = """
+    result.{reader_name} = {await_}getattr(READERS, '{reader_name}').read_array{suffix}(stream, {count})"""
 GOTO_INSTRUCTION = """
-reader.seek(int({reader_name}.{attr_name}), 0)"""
+    {await_}stream.seek(int(result.{reader_name}.{attr_name}), 0)"""
 
-def generate_code(ast):
+def generate_code(ast, instrument=False):
     code = BASE_CODE
+    if instrument:
+        code += INSTRUMENT_CODE
     if ast.tables:
         table_code = BASE_TABLES_CODE
         for table in ast.tables:
-            table_code += TABLE_ENTRY_CODE.format(name=table.name, table=table.table)
+            table_code += generate_table(table)
         code += table_code
     if ast.bitflags:
         bitflags_code = BASE_BITFLAGS_CODE
@@ -161,19 +254,140 @@ def generate_code(ast):
     if ast.readers:
         readers_code = BASE_READER_CODE
         for reader in ast.readers:
-            readers_code += READER_CODE.format(name=reader.name)
+            base = "InstrumentedReader" if instrument else "Reader"
+            names = [rule.name for rule in reader.rules]
+            check_field_names(reader)
+            readers_code += READER_CODE.format(
+                name=reader.name,
+                base=base,
+                layout=generate_struct_layout(reader),
+                slots="".join(f'"_{name}", ' for name in names) + '"_cache"',
+                arguments="".join(f", {name}" for name in names),
+                assignments="".join(READER_ASSIGNMENT_CODE.format(name=name) for name in names),
+                values=", ".join(f"self._{name}" for name in names) + ("," if len(names) == 1 else ""),
+                expect=generate_expect(ast, reader),
+            )
             for rule in reader.rules:
                 name = rule.name
                 to_read = rule.nb_to_read
-                as_rule = generate_as_rule(rule.as_rule)
+                as_rule = generate_as_rule(ast, rule.as_rule)
+                if instrument:
+                    as_rule = f"_timed('decode {reader.name}.{name}', {as_rule})"
                 readers_code += READER_ENTRY_CODE.format(name=name, to_read=to_read, as_rule=as_rule)
         code += readers_code
     code += "\n\n"
-    if ast.code is not None:
-        code += generate_read_instructions(ast.code)
+    check_read_instructions(ast, ast.code or [])
+    instructions = generate_read_instructions(ast, ast.code or [], instrument=instrument)
+    async_instructions = generate_read_instructions(ast, ast.code or [], is_async=True, instrument=instrument)
+    code += generate_magic(ast)
+    code += PARSE_CODE.format(
+        program="InstrumentedProgram" if instrument else "Program",
+        steps=generate_steps(ast.code or []),
+        instructions=instructions,
+        async_instructions=async_instructions,
+        wrap_stream=WRAP_STREAM_CODE if instrument else "",
+        wrap_async_stream=WRAP_ASYNC_STREAM_CODE if instrument else "",
+    )
     return code
 
-def generate_as_rule(as_rule):
+MAGIC_CODE = """
+MAGIC = ({value!r}, {offset})
+
+"""
+
+def generate_magic(ast):
+    magic = ast.magic
+    if magic is None:
+        return MAGIC_CODE.format(value=None, offset=None)
+    field = magic.field
+    readers = {reader.name: reader for reader in ast.readers}
+    offset = 0
+    for instruction in ast.code or []:
+        if isinstance(instruction, READ) and instruction.reader_name == field.cls_name:
+            for rule in readers[field.cls_name].rules:
+                if rule.name == field.attr_name:
+                    break
+                offset += rule.nb_to_read
+            else:
+                raise Exception(f"No such field {field.cls_name}.{field.attr_name}")
+            break
+        elif isinstance(instruction, READ):
+            offset += reader_size(ast, instruction.reader_name)
+        elif isinstance(instruction, READ_ARRAY) and isinstance(instruction.count, int):
+            offset += reader_size(ast, instruction.reader_name) * instruction.count
+        else:
+            raise Exception(f"The magic field {field.cls_name}.{field.attr_name} must be read before any goto or variable array")
+    else:
+        raise Exception(f"The magic field {field.cls_name}.{field.attr_name} is never read")
+    size = rule.nb_to_read
+    if isinstance(magic.value, str):
+        value = magic.value.encode("latin-1")
+        if len(value) > size:
+            raise Exception(f"The magic {magic.value!r} does not fit in {field.cls_name}.{field.attr_name}")
+    else:
+        value = magic.value.to_bytes(size, "little")
+    return MAGIC_CODE.format(value=value, offset=offset)
+
+RESERVED_NAMES = {"self", "to_tuple", "cache"} | {name for name in dir(runtime.Reader) if not name.startswith("_")}
+
+def check_field_names(reader):
+    seen = set()
+    for rule in reader.rules:
+        if rule.name in RESERVED_NAMES or keyword.iskeyword(rule.name):
+            raise Exception(f"{reader.name}.{rule.name}: '{rule.name}' is reserved and can't be used as a field name")
+        if rule.name in seen:
+            raise Exception(f"{reader.name}.{rule.name} is declared twice")
+        seen.add(rule.name)
+
+EXPECT_CODE = """
+        __expect__ = ({checks})"""
+
+def constant_value(value, size, where):
+    if isinstance(value, str):
+        value = int.from_bytes(value.encode("latin-1"), "little")
+    if not 0 <= value < 1 << (8 * size):
+        raise Exception(f"{value:#x} does not fit in {where}")
+    return value
+
+def generate_expect(ast, reader):
+    checks = []
+    magic = ast.magic
+    for index, rule in enumerate(reader.rules):
+        where = f"{reader.name}.{rule.name}"
+        expect = rule.expect
+        if expect is None and magic and (magic.field.cls_name, magic.field.attr_name) == (reader.name, rule.name):
+            value = magic.value.encode("latin-1") if isinstance(magic.value, str) else b""
+            if len(value) == rule.nb_to_read or isinstance(magic.value, int):
+                expect = Expect([magic.value])
+        if expect is None:
+            continue
+        if expect.values:
+            values = sorted({constant_value(value, rule.nb_to_read, where) for value in expect.values})
+            checks.append(f"({index}, frozenset({{{', '.join(hex(value) for value in values)}}})), ")
+        else:
+            low = constant_value(expect.low, rule.nb_to_read, where)
+            high = constant_value(expect.high, rule.nb_to_read, where)
+            checks.append(f"({index}, range({low:#x}, {high + 1:#x})), ")
+    if not checks:
+        return ""
+    return EXPECT_CODE.format(checks="".join(checks).rstrip(" "))
+
+STRUCT_CODES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+def generate_struct_layout(reader):
+    codes = (STRUCT_CODES.get(rule.nb_to_read, f"{rule.nb_to_read}s") for rule in reader.rules)
+    return "< " + " ".join(codes)
+
+DENSE_TABLE_SIZE = 256
+
+def generate_table(table):
+    keys = table.table.keys()
+    if keys and all(isinstance(key, int) and 0 <= key < DENSE_TABLE_SIZE for key in keys):
+        values = [table.table.get(key) for key in range(max(keys) + 1)]
+        return DENSE_TABLE_ENTRY_CODE.format(name=table.name, table=values)
+    return TABLE_ENTRY_CODE.format(name=table.name, table=table.table)
+
+def generate_as_rule(ast, as_rule):
     if as_rule is None:
         return "_hex"
     name = as_rule.as_name
@@ -181,23 +395,103 @@ def generate_as_rule(as_rule):
         return f"_{name}"
     elif name == "bytes":
         return "_to_bytes"
+    elif any(table.name == name for table in ast.tables):
+        return f"MAPS.{name}"
+    elif any(bitflag.name == name for bitflag in ast.bitflags):
+        return f"BITFLAGS.{name}.decode"
     else:
-        return f"_runtime_lookup('{name}')"
+        raise Exception(f"No such map or bitflag {name}")
 
-def generate_read_instructions(instructions):
+def check_read_instructions(ast, instructions):
+    fields = {reader.name: {rule.name for rule in reader.rules} for reader in ast.readers}
+    read = set()
+    for instruction in instructions:
+        references = []
+        if isinstance(instruction, GOTO):
+            references.append(instruction)
+        elif isinstance(instruction, READ_ARRAY) and isinstance(instruction.count, Field):
+            references.append(instruction.count)
+        for reference in references:
+            if reference.cls_name not in read:
+                raise Exception(f"{reference.cls_name}.{reference.attr_name} is used before {reference.cls_name} is read")
+            if reference.attr_name not in fields[reference.cls_name]:
+                raise Exception(f"No such field {reference.cls_name}.{reference.attr_name}")
+        if isinstance(instruction, (READ, READ_ARRAY)):
+            if instruction.reader_name not in fields:
+                raise Exception(f"No such reader {instruction.reader_name}")
+            if isinstance(instruction, READ):
+                read.add(instruction.reader_name)
+            else:
+                read.discard(instruction.reader_name)
+
+def generate_steps(instructions):
     code = ""
     for instruction in instructions:
         if isinstance(instruction, READ):
-            code += generate_READ(instruction)
+            code += STEP_CODE.format(kind="read", target=f"READERS.{instruction.reader_name}", argument=None)
+        elif isinstance(instruction, READ_ARRAY):
+            count = instruction.count
+            if isinstance(count, Field):
+                count = (count.cls_name, count.attr_name)
+            code += STEP_CODE.format(kind="read_array", target=f"READERS.{instruction.reader_name}", argument=repr(count))
         elif isinstance(instruction, GOTO):
-            code += generate_GOTO(instruction)
+            code += STEP_CODE.format(kind="goto", target=repr(instruction.cls_name), argument=repr(instruction.attr_name))
+    return code
+
+def generate_read_instructions(ast, instructions, is_async=False, instrument=False):
+    chunks = []
+    run = []
+    for index, instruction in enumerate(instructions + [None]):
+        if isinstance(instruction, READ):
+            run.append((index, instruction))
+            continue
+        if run:
+            names = ", ".join(read.reader_name for _, read in run)
+            label = f"{run[0][0]}: read {names}"
+            if len(run) == 1:
+                chunks.append((label, generate_READ(run[0][1], is_async)))
+            else:
+                chunks.append((label, generate_range_READ(ast, [read for _, read in run], is_async)))
+        run = []
+        if isinstance(instruction, READ_ARRAY):
+            label = f"{index}: read {instruction.reader_name}[]"
+            chunks.append((label, generate_READ_ARRAY(instruction, is_async)))
+        elif isinstance(instruction, GOTO):
+            label = f"{index}: goto {instruction.cls_name}.{instruction.attr_name}"
+            chunks.append((label, generate_GOTO(instruction, is_async)))
+    if instrument:
+        return "".join(PROBE_CODE + chunk + RECORD_CODE.format(label=label) for label, chunk in chunks)
+    return "".join(chunk for _, chunk in chunks)
+
+def async_parts(is_async):
+    return {"await_": "await " if is_async else "", "suffix": "_async" if is_async else ""}
+
+def generate_READ(instruction, is_async=False):
+    reader_name = instruction.reader_name
+    return READ_INSTRUCTION.format(reader_name=reader_name, **async_parts(is_async))
+
+def reader_size(ast, reader_name):
+    for reader in ast.readers:
+        if reader.name == reader_name:
+            return sum(rule.nb_to_read for rule in reader.rules)
+
+def generate_range_READ(ast, instructions, is_async=False):
+    sizes = [reader_size(ast, instruction.reader_name) for instruction in instructions]
+    code = RANGE_READ_INSTRUCTION.format(size=sum(sizes), **async_parts(is_async))
+    offset = 0
+    for instruction, size in zip(instructions, sizes):
+        code += BUFFER_READ_INSTRUCTION.format(reader_name=instruction.reader_name, offset=offset)
+        offset += size
     return code
 
-def generate_READ(instruction):
+def generate_READ_ARRAY(instruction, is_async=False):
     reader_name = instruction.reader_name
-    return READ_INSTRUCTION.format(reader_name=reader_name)
+    count = instruction.count
+    if isinstance(count, Field):
+        count = f"int(result.{count.cls_name}.{count.attr_name})"
+    return READ_ARRAY_INSTRUCTION.format(reader_name=reader_name, count=count, **async_parts(is_async))
 
-def generate_GOTO(instruction):
+def generate_GOTO(instruction, is_async=False):
     reader_name = instruction.cls_name
     attr_name = instruction.attr_name
-    return GOTO_INSTRUCTION.format(reader_name=reader_name, attr_name=attr_name)
\ No newline at end of file
+    return GOTO_INSTRUCTION.format(reader_name=reader_name, attr_name=attr_name, **async_parts(is_async))
\ No newline at end of file
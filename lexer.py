@@ -1,71 +1,35 @@
-from token import Token, Type
+from tokens import Token, Type
+import re, sys
+
+
+TOKEN_REGEX = re.compile(r"""
+    (?P<EOL>\n)
+  | (?P<SPACE>[^\S\n]+)
+  | (?P<NUMBER>0x[0-9a-fA-F]+|\d+)
+  | (?P<IDENTIFIER>[^\W\d_]\w*)
+  | (?P<STRING>"[^"]*"?)
+  | (?P<SYNTAX>.)
+""", re.VERBOSE)
 
 
 class Lexer:
     def __init__(self, code):
         self.code = code
-        self.position = 0
-
-    @property
-    def current(self):
-        return self.code[self.position]
-
-    def eof(self):
-        return self.position >= len(self.code)
-
-    def next(self):
-        self.position += 1
 
     def tokenize(self):
-        result = []
-        while not self.eof():
-            current = self.current
-            if current == "\n":
-                self.next()
-                result.append(Token(current, Type.EOL))
-            elif current.isspace():
-                self.next()
+        intern = sys.intern
+        for match in TOKEN_REGEX.finditer(self.code):
+            kind = match.lastgroup
+            value = match.group()
+            if kind == "IDENTIFIER":
+                yield Token(intern(value), Type.Identifier)
+            elif kind == "SPACE":
                 continue
-            elif current.isdigit():
-                result.append(Token(self.find_number(), Type.Number))
-            elif current.isalnum():
-                result.append(Token(self.find_identifier(), Type.Identifier))
-            elif current == "\"":
-                result.append(Token(self.find_string(), Type.String))
+            elif kind == "EOL":
+                yield Token(value, Type.EOL)
+            elif kind == "NUMBER":
+                yield Token(int(value, 16) if "x" in value else int(value), Type.Number)
+            elif kind == "STRING":
+                yield Token(value[1:-1] if value.endswith("\"") and len(value) > 1 else value[1:], Type.String)
             else:
-                self.next()
-                result.append(Token(current, Type.Syntax))
-        return result
-
-    def find_number(self):
-        result = ""
-        is_hex = False
-        hex_str = "abcdef"
-        while not self.eof():
-            if self.current.isdigit():
-                result += self.current
-            elif is_hex and self.current in hex_str:
-                result += self.current
-            elif self.current == "x" and not is_hex:
-                result += self.current
-                is_hex = True
-            else:
-                break
-            self.next()
-        return int(result, 16) if is_hex else int(result)
-
-    def find_identifier(self):
-        result = ""
-        while not self.eof() and self.current.isalnum() or self.current == "_":
-            result += self.current
-            self.next()
-        return result
-
-    def find_string(self):
-        result = ""
-        self.next()
-        while not self.eof() and self.current != "\"":
-            result += self.current
-            self.next()
-        self.next()
-        return result
\ No newline at end of file
+                yield Token(value, Type.Syntax)
@@ -0,0 +1,86 @@
+from lexer import Lexer
+from parser import Parser
+from codegen import generate_code
+import importlib.abc, importlib.machinery, importlib.util, marshal, os, sys, types
+import codegen, lexer, nodes, parser, runtime, tokens
+
+
+COMPILER_MTIME = max(os.stat(module.__file__).st_mtime for module in (tokens, lexer, nodes, parser, codegen, runtime))
+
+
+def compile_source(code, instrument=False):
+    lexer = Lexer(code)
+    tokens = lexer.tokenize()
+    parser = Parser(tokens)
+    ast = parser.parse()
+    return generate_code(ast, instrument=instrument)
+
+
+def load_source(code, name="format", filename=None, instrument=False):
+    module = types.ModuleType(name)
+    module.__file__ = filename or f"<format {name}>"
+    exec(compile(compile_source(code, instrument), module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def load_file(path, name=None, instrument=False):
+    with open(path) as doc:
+        code = doc.read()
+    return load_source(code, name or os.path.basename(path), path, instrument)
+
+
+class FormatLoader(importlib.machinery.SourceFileLoader):
+    def source_to_code(self, data, path, *, _optimize=-1):
+        code = compile_source(importlib.util.decode_source(data))
+        return compile(code, path, "exec", dont_inherit=True, optimize=_optimize)
+
+    def path_stats(self, path):
+        stats = super().path_stats(path)
+        stats["mtime"] = max(stats["mtime"], COMPILER_MTIME)
+        return stats
+
+    def cache_path(self):
+        return importlib.util.cache_from_source(self.path + ".py")
+
+    def get_code(self, fullname):
+        stats = self.path_stats(self.path)
+        header = importlib.util.MAGIC_NUMBER + bytes(4) + (int(stats["mtime"]) & 0xFFFFFFFF).to_bytes(4, "little") + (stats["size"] & 0xFFFFFFFF).to_bytes(4, "little")
+        cached = self.cache_path()
+        try:
+            data = self.get_data(cached)
+            if data[:16] == header:
+                return marshal.loads(data[16:])
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        code = self.source_to_code(self.get_data(self.path), self.path)
+        if not sys.dont_write_bytecode:
+            self.set_data(cached, header + marshal.dumps(code))
+        return code
+
+
+class FormatFinder(importlib.abc.MetaPathFinder):
+    def __init__(self, packages=("formats",)):
+        self.packages = tuple(packages)
+
+    def find_spec(self, fullname, path, target=None):
+        package, _, name = fullname.rpartition(".")
+        if package not in self.packages or path is None:
+            return None
+        for directory in path:
+            filename = os.path.join(directory, name)
+            if os.path.isfile(filename):
+                loader = FormatLoader(fullname, filename)
+                spec = importlib.util.spec_from_file_location(fullname, filename, loader=loader)
+                spec.cached = loader.cache_path()
+                return spec
+        return None
+
+
+def install(packages=("formats",)):
+    for finder in sys.meta_path:
+        if isinstance(finder, FormatFinder):
+            finder.packages += tuple(package for package in packages if package not in finder.packages)
+            return finder
+    finder = FormatFinder(packages)
+    sys.meta_path.insert(0, finder)
+    return finder
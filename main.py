@@ -1,21 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
 from lexer import Lexer
 from parser import Parser
 from codegen import generate_code
-import sys, os
+import argparse, hashlib, json, os, shutil, sys
 
 
-FORMAT = sys.argv[1]
-filename = os.path.basename(FORMAT)
-with open(FORMAT) as doc:
-    CODE = doc.read()
+COMPILER_FILES = ("tokens.py", "lexer.py", "nodes.py", "parser.py", "codegen.py", "runtime.py")
+MANIFEST = ".manifest.json"
 
-lexer = Lexer(CODE)
-tokens = lexer.tokenize()
-# print(tokens)
 
-parser = Parser(tokens)
-ast = parser.parse()
-# print(ast)
+def compiler_version():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in COMPILER_FILES:
+        with open(os.path.join(directory, name), "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
 
-with open(f"out/{filename}.py", "w") as doc:
-    doc.write(generate_code(ast))
\ No newline at end of file
+
+def source_hash(code, version, options=""):
+    return hashlib.sha256(f"{version}\n{options}\n{code}".encode()).hexdigest()
+
+
+def compile_format(code, instrument=False):
+    lexer = Lexer(code)
+    tokens = lexer.tokenize()
+    parser = Parser(tokens)
+    ast = parser.parse()
+    return generate_code(ast, instrument=instrument)
+
+
+def build(code, output, instrument=False):
+    generated = compile_format(code, instrument)
+    with open(output, "w") as doc:
+        doc.write(generated)
+    return output
+
+
+def install_runtime(directory):
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runtime.py")
+    target = os.path.join(directory, "runtime.py")
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    with open(source, "rb") as doc:
+        runtime = doc.read()
+    try:
+        with open(target, "rb") as doc:
+            if doc.read() == runtime:
+                return
+    except OSError:
+        pass
+    shutil.copyfile(source, target)
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as doc:
+            return json.load(doc)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as doc:
+        json.dump(manifest, doc, indent=4, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile format files into python readers.")
+    parser.add_argument("formats", nargs="+", help="format files to compile")
+    parser.add_argument("-o", "--output", default="out", help="output directory (default: out)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: number of cores)")
+    parser.add_argument("-f", "--force", action="store_true", help="compile even the formats that did not change")
+    parser.add_argument("--instrument", action="store_true", help="collect per-reader and per-instruction statistics in the generated code")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    install_runtime(args.output)
+    manifest = load_manifest(args.output)
+    version = compiler_version()
+    jobs = {}
+    for path in args.formats:
+        with open(path) as doc:
+            code = doc.read()
+        filename = f"{os.path.basename(path)}.py"
+        output = os.path.join(args.output, filename)
+        digest = source_hash(code, version, "instrument" if args.instrument else "")
+        if not args.force and manifest.get(filename) == digest and os.path.exists(output):
+            print(f"{path}: up to date")
+            continue
+        jobs[filename] = (path, code, output, digest)
+
+    failed = False
+    if len(jobs) > 1 and args.jobs != 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            futures = {filename: pool.submit(build, code, output, args.instrument) for filename, (path, code, output, digest) in jobs.items()}
+            results = {filename: future.exception() for filename, future in futures.items()}
+    else:
+        results = {}
+        for filename, (path, code, output, digest) in jobs.items():
+            try:
+                build(code, output, args.instrument)
+                results[filename] = None
+            except Exception as error:
+                results[filename] = error
+    for filename, error in results.items():
+        path, code, output, digest = jobs[filename]
+        if error is None:
+            manifest[filename] = digest
+            print(f"{path}: compiled into {output}")
+        else:
+            manifest.pop(filename, None)
+            failed = True
+            print(f"{path}: {type(error).__name__}: {error}", file=sys.stderr)
+    save_manifest(args.output, manifest)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,11 +4,12 @@ class AST:
 
 
 class Root(AST):
-    def __init__(self, readers, tables, bitflags, code):
+    def __init__(self, readers, tables, bitflags, code, magic=None):
         self.readers = readers
         self.tables = tables
         self.bitflags = bitflags
         self.code = code
+        self.magic = magic
 
 
 class Reader(AST):
@@ -18,10 +19,18 @@ class Reader(AST):
 
 
 class Rule(AST):
-    def __init__(self, name, nb_to_read, as_rule=None):
+    def __init__(self, name, nb_to_read, as_rule=None, expect=None):
         self.name = name
         self.nb_to_read = nb_to_read
         self.as_rule = as_rule
+        self.expect = expect
+
+
+class Expect(AST):
+    def __init__(self, values=(), low=None, high=None):
+        self.values = values
+        self.low = low
+        self.high = high
 
 
 class Map(AST):
@@ -36,6 +45,12 @@ class Bitflag(AST):
         self.rows = rows
 
 
+class Magic(AST):
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+
 class Instruction(AST):
     pass
 
@@ -50,4 +65,14 @@ class READ(Instruction):
 
 class READ_AS(Instruction):
     def __init__(self, as_name):
-        self.as_name = as_name
\ No newline at end of file
+        self.as_name = as_name
+
+class READ_ARRAY(Instruction):
+    def __init__(self, reader_name, count):
+        self.reader_name = reader_name
+        self.count = count
+
+class Field(AST):
+    def __init__(self, cls_name, attr_name):
+        self.cls_name = cls_name
+        self.attr_name = attr_name
\ No newline at end of file
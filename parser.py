@@ -1,34 +1,44 @@
-from token import Token, Type
-import ast
+from tokens import Token, Type
+import nodes
+
+
+EOF = Token(None, None)
+MAP = Token("map", Type.Identifier)
+READER = Token("reader", Type.Identifier)
+BITFLAG = Token("bitflag", Type.Identifier)
+MAIN = Token("main", Type.Identifier)
+MAGIC = Token("magic", Type.Identifier)
+END = Token("end", Type.Identifier)
+AS = Token("as", Type.Identifier)
+EXPECT = Token("expect", Type.Identifier)
+TO = Token("to", Type.Identifier)
+COMMA = Token(",", Type.Syntax)
+OPEN_BRACKET = Token("[", Type.Syntax)
+CLOSE_BRACE = Token("}", Type.Syntax)
 
 
 class Parser:
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.position = 0
-
-    @property
-    def current(self):
-        return self.tokens[self.position]
+        self.tokens = iter(tokens)
+        self.current = EOF
+        self.next()
 
     def eof(self):
-        return self.position >= len(self.tokens)
+        return self.current is EOF
 
     def next(self):
-        self.position += 1
+        self.current = next(self.tokens, EOF)
 
     def next_assert(self, flag, value=None):
         current = self.current
-        if current.flag == flag and value is None:
-            self.next()
-        elif current.flag == flag and current.value == value:
+        if current.flag is flag and (value is None or current.value == value):
             self.next()
         else:
             raise AssertionError(f"current={self.current} ; flag={flag} ; value={value}")
         return current
 
     def skip_lines(self):
-        while not self.eof() and self.current.flag == Type.EOL:
+        while self.current.flag is Type.EOL:
             self.next()
 
     def parse(self):
@@ -36,20 +46,23 @@ class Parser:
         tables = []
         bitflags = []
         code = None
+        magic = None
         self.skip_lines()
         while not self.eof():
-            if self.current == Token("map", Type.Identifier):
+            if self.current == MAP:
                 tables.append(self.parse_map())
-            elif self.current == Token("reader", Type.Identifier):
+            elif self.current == READER:
                 readers.append(self.parse_reader())
-            elif self.current == Token("bitflag", Type.Identifier):
+            elif self.current == BITFLAG:
                 bitflags.append(self.parse_bitflag())
-            elif self.current == Token("main", Type.Identifier):
+            elif self.current == MAIN:
                 code = self.parse_code()
+            elif self.current == MAGIC:
+                magic = self.parse_magic()
             else:
                 raise Exception(f"Invalid token {self.current}")
             self.skip_lines()
-        return ast.Root(readers, tables, bitflags, code)
+        return nodes.Root(readers, tables, bitflags, code, magic)
 
     def parse_reader(self):
         self.next_assert(Type.Identifier, "reader")
@@ -57,22 +70,43 @@ class Parser:
         self.next_assert(Type.Identifier, "where")
         self.next_assert(Type.EOL)
         rules = []
-        while self.current != Token("end", Type.Identifier):
+        while self.current != END:
             self.next_assert(Type.Syntax, "|")
             rules.append(self.parse_rule())
             self.next_assert(Type.EOL)
         self.next_assert(Type.Identifier, "end")
-        return ast.Reader(reader_name, rules)
+        return nodes.Reader(reader_name, rules)
 
     def parse_rule(self):
         rule_name = self.next_assert(Type.Identifier).value
         self.next_assert(Type.Syntax, ":")
         nb_to_read = self.next_assert(Type.Number).value
-        if self.current == Token("as", Type.Identifier):
+        if self.current == AS:
             instruction = self.parse_as_rule()
         else:
             instruction = None
-        return ast.Rule(rule_name, nb_to_read, instruction)
+        if self.current == EXPECT:
+            expect = self.parse_expect()
+        else:
+            expect = None
+        return nodes.Rule(rule_name, nb_to_read, instruction, expect)
+
+    def parse_expect(self):
+        self.next_assert(Type.Identifier, "expect")
+        value = self.parse_constant()
+        if self.current == TO:
+            self.next()
+            return nodes.Expect(low=value, high=self.parse_constant())
+        values = [value]
+        while self.current == COMMA:
+            self.next()
+            values.append(self.parse_constant())
+        return nodes.Expect(values)
+
+    def parse_constant(self):
+        if self.current.flag is Type.String:
+            return self.next_assert(Type.String).value
+        return self.next_assert(Type.Number).value
 
     def parse_map(self):
         self.next_assert(Type.Identifier, "map")
@@ -80,12 +114,12 @@ class Parser:
         self.next_assert(Type.Identifier, "where")
         self.next_assert(Type.EOL)
         table = {}
-        while self.current != Token("end", Type.Identifier):
+        while self.current != END:
             self.next_assert(Type.Syntax, "|")
             table.update(self.parse_table_entry())
             self.next_assert(Type.EOL)
         self.next_assert(Type.Identifier, "end")
-        return ast.Map(table_name, table)
+        return nodes.Map(table_name, table)
 
     def parse_table_entry(self):
         key = self.next_assert(Type.Number).value
@@ -100,12 +134,12 @@ class Parser:
         self.next_assert(Type.Identifier, "where")
         self.next_assert(Type.EOL)
         rows = []
-        while self.current != Token("end", Type.Identifier):
+        while self.current != END:
             self.next_assert(Type.Syntax, "|")
             rows.append(self.parse_biflag_row())
             self.next_assert(Type.EOL)
         self.next_assert(Type.Identifier, "end")
-        return ast.Bitflag(table_name, rows)
+        return nodes.Bitflag(table_name, rows)
 
     def parse_biflag_row(self):
         key = self.next_assert(Type.Number).value
@@ -116,13 +150,19 @@ class Parser:
     def parse_as_rule(self):
         self.next_assert(Type.Identifier, "as")
         name = self.next_assert(Type.Identifier).value
-        return ast.READ_AS(name)
+        return nodes.READ_AS(name)
+
+    def parse_magic(self):
+        self.next_assert(Type.Identifier, "magic")
+        field = self.parse_field()
+        self.next_assert(Type.Syntax, "=")
+        return nodes.Magic(field, self.parse_constant())
 
     def parse_code(self):
         self.next_assert(Type.Identifier, "main")
         self.next_assert(Type.Syntax, "{")
         instructions = []
-        while self.current != Token("}", Type.Syntax):
+        while self.current != CLOSE_BRACE:
             self.skip_lines()
             instructions.append(self.parse_instruction())
             self.next_assert(Type.EOL)
@@ -140,10 +180,27 @@ class Parser:
 
     def _parse_READ(self):
         reader_name = self.next_assert(Type.Identifier).value
-        return ast.READ(reader_name)
+        if self.current == OPEN_BRACKET:
+            return self._parse_READ_ARRAY(reader_name)
+        return nodes.READ(reader_name)
+
+    def _parse_READ_ARRAY(self, reader_name):
+        self.next_assert(Type.Syntax, "[")
+        if self.current.flag is Type.Number:
+            count = self.next_assert(Type.Number).value
+        else:
+            count = self.parse_field()
+        self.next_assert(Type.Syntax, "]")
+        return nodes.READ_ARRAY(reader_name, count)
+
+    def parse_field(self):
+        cls_name = self.next_assert(Type.Identifier).value
+        self.next_assert(Type.Syntax, ".")
+        attr_name = self.next_assert(Type.Identifier).value
+        return nodes.Field(cls_name, attr_name)
     
     def _parse_GOTO(self):
         cls_name = self.next_assert(Type.Identifier).value
         self.next_assert(Type.Syntax, ".")
         attr_name = self.next_assert(Type.Identifier).value
-        return ast.GOTO(cls_name, attr_name)
\ No newline at end of file
+        return nodes.GOTO(cls_name, attr_name)
\ No newline at end of file
@@ -0,0 +1,814 @@
+from collections import OrderedDict
+import mmap
+import os
+import struct
+import threading
+
+numpy = None
+_numpy_loaded = False
+
+def load_numpy():
+    global numpy, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
+
+
+class MemoryStream:
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        self.position = 0
+
+    @classmethod
+    def map(cls, path):
+        with open(path, "rb") as file:
+            try:
+                return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            except ValueError:
+                return cls(b"")
+
+    def read(self, size):
+        start = self.position
+        self.position = min(start + size, len(self.buffer))
+        return self.buffer[start:self.position]
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += len(self.buffer)
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return True
+
+
+class CachedStream:
+    def __init__(self, raw, block_size=16384, blocks=64, size=None, closing=()):
+        self.raw = raw
+        self.block_size = block_size
+        self.max_blocks = blocks
+        self.blocks = OrderedDict()
+        self.size = size
+        self.closing = (raw, *closing)
+        self.position = 0
+
+    def block(self, index):
+        block = self.blocks.get(index)
+        if block is not None:
+            self.blocks.move_to_end(index)
+            return block
+        self.raw.seek(index * self.block_size)
+        block = self.blocks[index] = self.raw.read(self.block_size)
+        if len(self.blocks) > self.max_blocks:
+            self.blocks.popitem(last=False)
+        return block
+
+    def read(self, size):
+        chunks = []
+        while size > 0:
+            index, start = divmod(self.position, self.block_size)
+            chunk = self.block(index)[start:start + size]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            if self.size is None:
+                self.size = self.raw.seek(0, 2)
+            offset += self.size
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        for source in self.closing:
+            source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_ARCHIVES = OrderedDict()
+_ARCHIVES_LOCK = threading.Lock()
+
+def open_archive(path, keep=8):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _ARCHIVES_LOCK:
+        archive = _ARCHIVES.pop(key, None)
+        if archive is None:
+            import zipfile
+            if not zipfile.is_zipfile(path):
+                raise ValueError(f"{path} is not a zip archive")
+            archive = zipfile.ZipFile(path)
+        _ARCHIVES[key] = archive
+        while len(_ARCHIVES) > keep:
+            _ARCHIVES.popitem(last=False)[1].close()
+    return archive
+
+
+def open_source(path, block_size=16384, blocks=64):
+    archive, separator, member = path.partition("::")
+    if separator and not os.path.exists(path) and os.path.isfile(archive):
+        archive = open_archive(archive)
+        info = archive.getinfo(member)
+        return CachedStream(archive.open(info), block_size, blocks, info.file_size)
+    file = open(path, "rb")
+    if path.endswith(".gz") and file.peek(2)[:2] == b"\x1f\x8b":
+        import gzip
+        return CachedStream(gzip.GzipFile(fileobj=file), block_size, blocks, closing=(file,))
+    return file
+
+
+_SEEK_LOCK = threading.Lock()
+
+def _pread(fd, size, offset):
+    with _SEEK_LOCK:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+pread = getattr(os, "pread", _pread)
+
+
+class PositionalStream:
+    def __init__(self, fd, offset=0):
+        self.fd = fd if isinstance(fd, int) else fd.fileno()
+        self.offset = offset
+        self.position = 0
+
+    def read(self, size):
+        data = pread(self.fd, size, self.offset + self.position)
+        while len(data) < size:
+            more = pread(self.fd, size - len(data), self.offset + self.position + len(data))
+            if not more:
+                break
+            data += more
+        self.position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += os.fstat(self.fd).st_size - self.offset
+        self.position = max(offset, 0)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return True
+
+
+class ForwardStream:
+    def __init__(self, raw, rewind=4096):
+        self.raw = raw
+        self.rewind = rewind
+        self.history = bytearray()
+        self.scratch = memoryview(bytearray(65536))
+        self.end = 0
+        self.position = 0
+
+    def remember(self, data):
+        self.end += len(data)
+        if self.rewind:
+            self.history += data[-self.rewind:]
+            del self.history[:-self.rewind]
+
+    def pull(self, size):
+        chunks = []
+        while size > 0:
+            chunk = self.raw.read(size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size -= len(chunk)
+        data = b"".join(chunks)
+        self.remember(data)
+        return data
+
+    def skip(self, size):
+        readinto = getattr(self.raw, "readinto", None)
+        while size > 0:
+            view = self.scratch[:min(size, len(self.scratch))]
+            if readinto is not None:
+                data = view[:readinto(view) or 0]
+            else:
+                data = self.raw.read(len(view))
+            if not data:
+                break
+            self.remember(data)
+            size -= len(data)
+
+    def read(self, size):
+        data = b""
+        if self.position < self.end:
+            start = len(self.history) - (self.end - self.position)
+            data = bytes(self.history[start:start + size])
+        if len(data) < size:
+            data += self.pull(size - len(data))
+        self.position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            raise ValueError("cannot seek from the end of a stream")
+        if offset < self.end - len(self.history):
+            raise ValueError(f"cannot go back to {offset} in a stream, only the last {self.rewind} bytes are kept")
+        if offset > self.end:
+            self.skip(offset - self.end)
+        self.position = min(offset, self.end)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return False
+
+
+def seekable(stream):
+    try:
+        return stream.seekable()
+    except AttributeError:
+        return True
+
+
+class AsyncStream:
+    def __init__(self, source):
+        self.source = source
+        self.position = 0
+        self.chunks = None if hasattr(source, "read") else source.__aiter__()
+        self.pending = b""
+
+    async def pull(self, size):
+        if self.chunks is None:
+            return await self.source.read(size)
+        if not self.pending:
+            try:
+                self.pending = await self.chunks.__anext__()
+            except StopAsyncIteration:
+                return b""
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    async def read(self, size):
+        if hasattr(self.source, "readexactly"):
+            try:
+                data = await self.source.readexactly(size)
+            except EOFError as error:
+                data = error.partial
+        else:
+            chunks = []
+            remaining = size
+            while remaining > 0:
+                chunk = await self.pull(remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+            data = b"".join(chunks)
+        self.position += len(data)
+        return data
+
+    async def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        if offset < self.position:
+            raise ValueError(f"cannot go back from {self.position} to {offset} in a stream")
+        while self.position < offset:
+            if not await self.read(min(offset - self.position, 65536)):
+                break
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class Result:
+    def __repr__(self):
+        return "Result({})".format(", ".join(vars(self)))
+
+
+class LazyResult:
+    def __init__(self, stream, program, eager=False):
+        self._stream = stream
+        self._program = program
+        self._eager = eager
+        self._start = stream.tell()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            self._program.plan([name])
+        except ValueError:
+            raise AttributeError(f"No such reader {name}") from None
+        self._stream.seek(self._start, 0)
+        value = getattr(self._program.run(self._stream, [name], self._eager), name)
+        setattr(self, name, value)
+        return value
+
+    def close(self):
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "LazyResult({})".format(", ".join(name for name in vars(self) if not name.startswith("_")))
+
+
+def _func_wrapper(func):
+    def inner_wrapper(self, *args, **kwargs):
+        return func(*args, **kwargs)
+    return inner_wrapper
+
+_int = _func_wrapper(int)
+_hex = _func_wrapper(hex)
+_bin = _func_wrapper(bin)
+
+
+def _to_bytes(rule, value):
+    return int.to_bytes(value, rule.to_read, "little")
+
+def _str(rule, value):
+    return _to_bytes(rule, value).decode("ascii")
+
+
+class Symbol:
+    __symbols__ = {}
+    def __new__(cls, value):
+        if value in cls.__symbols__:
+            return cls.__symbols__[value]
+        obj = object.__new__(cls)
+        cls.__symbols__[value] = obj
+        return obj
+    def __init__(self, value):
+        self.value = value
+    def __repr__(self):
+        return self.value
+    def __eq__(self, other):
+        return self is other
+
+
+class Flag:
+    __slots__ = ("number", "symbols")
+
+    def __init__(self, number, *symbols):
+        self.number = number
+        self.symbols = symbols
+    def __or__(self, other):
+        return Flag(self.number | other.number, *self.symbols, *other.symbols)
+    def __int__(self):
+        return self.number
+    def __repr__(self):
+        return " | ".join(str(symbol) for symbol in self.symbols) or hex(self.number)
+
+
+class Bitflag:
+    __cache_size__ = 4096
+
+    def __init_subclass__(cls):
+        cls.__members__ = [item[0] for item in vars(cls).items() if isinstance(item[1], Flag)]
+        flags = [getattr(cls, member) for member in cls.__members__]
+        cls.__mask__ = 0
+        for flag in flags:
+            cls.__mask__ |= flag.number
+        cls.__tables__ = []
+        for shift in range(0, cls.__mask__.bit_length(), 8):
+            table = []
+            for byte in range(256):
+                members = 0
+                for index, flag in enumerate(flags):
+                    if (flag.number >> shift) & byte:
+                        members |= 1 << index
+                table.append(members)
+            cls.__tables__.append(table)
+        cls.__cache__ = {}
+
+    @classmethod
+    def get(cls, value):
+        try:
+            return cls.__cache__[value]
+        except KeyError:
+            pass
+        members = 0
+        shift = 0
+        for table in cls.__tables__:
+            members |= table[(value >> shift) & 0xff]
+            shift += 8
+        symbols = ()
+        for index, member in enumerate(cls.__members__):
+            if members >> index & 1:
+                symbols += getattr(cls, member).symbols
+        unknown = value & ~cls.__mask__
+        if unknown:
+            symbols += (hex(unknown),)
+        flag = Flag(value, *symbols)
+        if len(cls.__cache__) < cls.__cache_size__:
+            cls.__cache__[value] = flag
+        return flag
+
+    @classmethod
+    def decode(cls, rule, value):
+        return cls.get(value)
+
+    @classmethod
+    def to_dict(cls):
+        return {flag.number: " | ".join(flag.symbols) for flag in (getattr(cls, member) for member in cls.__members__)}
+
+
+class Map:
+    __slots__ = ("table",)
+
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, value):
+        result = self.table.get(value)
+        return hex(value) if result is None else result
+
+    def __call__(self, rule, value):
+        return self.get(value)
+
+    def to_dict(self):
+        return dict(self.table)
+
+
+class DenseMap(Map):
+    def get(self, value):
+        try:
+            result = self.table[value]
+        except IndexError:
+            result = None
+        return hex(value) if result is None else result
+
+    def to_dict(self):
+        return {key: value for key, value in enumerate(self.table) if value is not None}
+
+
+class Attribute:
+    __slots__ = ("value", "changed_value")
+
+    def __init__(self, value, changed_value):
+        self.value = value
+        self.changed_value = changed_value
+
+    def __int__(self):
+        return self.value
+
+    def __repr__(self):
+        return str(self.changed_value)
+
+
+class ReaderRule:
+    __slots__ = ("to_read", "as_rule", "name", "attr_name")
+
+    def __init__(self, to_read, as_rule):
+        self.to_read = to_read
+        self.as_rule = as_rule
+        self.name = None
+        self.attr_name = None
+
+    def __get__(self, instance, owner):
+        if instance is not None:
+            cache = instance._cache
+            if cache is None:
+                cache = instance._cache = {}
+            attribute = cache.get(self.attr_name)
+            if attribute is None:
+                value = getattr(instance, self.name)
+                if value is None:
+                    raise AttributeError(f"{type(instance).__name__}.{self.attr_name} was not read")
+                attribute = cache[self.attr_name] = Attribute(value, self.as_rule(self, value))
+            return attribute
+        else:
+            return self
+
+    def __set_name__(self, cls, name):
+        self.name = f"_{name}"
+        self.attr_name = name
+
+
+class ReaderArray:
+    def __init__(self, reader, records):
+        self.reader = reader
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        if type(record) is not tuple:
+            record = record.tolist()
+        return self.reader.from_values(record)
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def __repr__(self):
+        return f"{self.reader.__name__}[{len(self)}]"
+
+
+DTYPE_CODES = {"B": "<u1", "H": "<u2", "I": "<u4", "Q": "<u8"}
+
+
+class Rejected(ValueError):
+    def __init__(self, reader, field, value):
+        super().__init__(f"{reader.__name__}.{field} = {value:#x} is not expected")
+        self.reader = reader
+        self.field = field
+        self.value = value
+
+
+class Truncated(ValueError):
+    def __init__(self, reader, expected, actual):
+        super().__init__(f"{reader.__name__} needs {expected} bytes, got {actual}")
+        self.reader = reader
+        self.expected = expected
+        self.actual = actual
+
+
+class Reader:
+    __layout__ = "<"
+    __slots__ = ()
+    __expect__ = ()
+
+    def __init_subclass__(cls):
+        cls.__members__ = [item[0] for item in vars(cls).items() if isinstance(item[1], ReaderRule)]
+        cls.__fields__ = [f"_{name}" for name in cls.__members__]
+        cls.__struct__ = struct.Struct(cls.__layout__)
+        codes = cls.__layout__[1:].split()
+        cls.__fallback__ = [index for index, code in enumerate(codes) if code.endswith("s")]
+
+    @classmethod
+    def dtype(cls):
+        dtype = cls.__dict__.get("__dtype__")
+        if dtype is None:
+            formats = [DTYPE_CODES.get(code, f"V{code[:-1]}") for code in cls.__layout__[1:].split()]
+            dtype = cls.__dtype__ = numpy.dtype({"names": cls.__members__, "formats": formats})
+        return dtype
+
+    @classmethod
+    def from_values(cls, values):
+        if cls.__fallback__:
+            values = list(values)
+            for index in cls.__fallback__:
+                values[index] = int.from_bytes(values[index], "little")
+        for index, expected in cls.__expect__:
+            if values[index] not in expected:
+                raise Rejected(cls, cls.__members__[index], values[index])
+        return cls(*values)
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0, eager=False):
+        if len(buffer) - offset < cls.__struct__.size:
+            raise Truncated(cls, cls.__struct__.size, max(len(buffer) - offset, 0))
+        reader = cls.from_values(cls.__struct__.unpack_from(buffer, offset))
+        if eager:
+            reader.decode()
+        return reader
+
+    @classmethod
+    def read(cls, stream, eager=False):
+        return cls.from_buffer(stream.read(cls.__struct__.size), 0, eager)
+
+    @classmethod
+    async def read_async(cls, stream, eager=False):
+        return cls.from_buffer(await stream.read(cls.__struct__.size), 0, eager)
+
+    def decode(self, names=None):
+        for name in names or self.__members__:
+            getattr(self, name)
+        return self
+
+    def to_dict(self):
+        return dict(zip(self.__members__, self.to_tuple()))
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_tuple() == other.to_tuple()
+
+    def __lt__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.sort_key() < other.sort_key()
+
+    def sort_key(self):
+        return tuple((value is not None, value) for value in self.to_tuple())
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.to_tuple()))
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(f"{name}={getattr(self, field)!r}" for name, field in zip(self.__members__, self.__fields__) if getattr(self, field) is not None))
+
+    @classmethod
+    def projection(cls, names):
+        codes = cls.__layout__[1:].split()
+        sizes = [getattr(cls, member).to_read for member in cls.__members__]
+        wanted = [index for index, member in enumerate(cls.__members__) if member in names]
+        first, last = wanted[0], wanted[-1]
+        layout = "<" + " ".join(codes[index] if index in wanted else f"{sizes[index]}x" for index in range(first, last + 1))
+        fallback = [position for position, index in enumerate(wanted) if index in cls.__fallback__]
+        expect = [(wanted.index(index), expected) for index, expected in cls.__expect__ if index in wanted]
+        names = [cls.__members__[index] for index in wanted]
+        return Projection(struct.Struct(layout), names, fallback, expect, sum(sizes[:first]), sum(sizes[last + 1:]))
+
+    @classmethod
+    def from_projection(cls, buffer, projection, eager=False):
+        if len(buffer) < projection.struct.size:
+            raise Truncated(cls, projection.struct.size, len(buffer))
+        values = projection.struct.unpack(buffer)
+        if projection.fallback:
+            values = list(values)
+            for index in projection.fallback:
+                values[index] = int.from_bytes(values[index], "little")
+        for index, expected in projection.expect:
+            if values[index] not in expected:
+                raise Rejected(cls, projection.names[index], values[index])
+        reader = cls.__new__(cls)
+        reader._cache = None
+        for field in cls.__fields__:
+            setattr(reader, field, None)
+        for field, value in zip(projection.fields, values):
+            setattr(reader, field, value)
+        if eager:
+            reader.decode(projection.names)
+        return reader
+
+    @classmethod
+    def array_from_buffer(cls, buffer, count):
+        size = cls.__struct__.size * count
+        if len(buffer) < size:
+            raise Truncated(cls, size, len(buffer))
+        if load_numpy() is not None:
+            records = numpy.frombuffer(buffer, dtype=cls.dtype(), count=count)
+        else:
+            records = list(cls.__struct__.iter_unpack(buffer[:size]))
+        return ReaderArray(cls, records)
+
+    @classmethod
+    def read_array(cls, stream, count):
+        return cls.array_from_buffer(stream.read(cls.__struct__.size * count), count)
+
+    @classmethod
+    async def read_array_async(cls, stream, count):
+        return cls.array_from_buffer(await stream.read(cls.__struct__.size * count), count)
+
+
+class Projection:
+    __slots__ = ("struct", "names", "fields", "fallback", "expect", "before", "after")
+
+    def __init__(self, struct, names, fallback, expect, before, after):
+        self.struct = struct
+        self.names = names
+        self.fields = [f"_{name}" for name in names]
+        self.fallback = fallback
+        self.expect = expect
+        self.before = before
+        self.after = after
+
+
+class Program:
+    def __init__(self, steps):
+        self.steps = steps
+        self.plans = {}
+
+    def plan(self, fields):
+        key = frozenset(fields)
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self.plans[key] = self.make_plan(key)
+        return plan
+
+    def make_plan(self, fields):
+        readers = {step[1].__name__: step[1] for step in self.steps if step[0] != "goto"}
+        wanted = {}
+        for field in fields:
+            name, _, attr_name = field.partition(".")
+            reader = readers.get(name)
+            if reader is None or (attr_name and attr_name not in reader.__members__):
+                raise ValueError(f"No such field {field}")
+            wanted.setdefault(name, set()).update([attr_name] if attr_name else reader.__members__)
+        steps = []
+        active = False
+        for kind, target, argument in reversed(self.steps):
+            if kind == "goto":
+                if active:
+                    steps.append((kind, target, argument))
+                    wanted.setdefault(target, set()).add(argument)
+                    active = False
+                continue
+            name = target.__name__
+            if kind == "read" and (name in wanted or (active and target.__expect__)):
+                expected = {target.__members__[index] for index, _ in target.__expect__}
+                projection = target.projection(wanted.pop(name, set()) | expected)
+                steps.extend([("skip", projection.after, None), ("read", target, projection), ("skip", projection.before, None)])
+            elif kind == "read" and active:
+                steps.append(("skip", target.__struct__.size, None))
+            elif kind == "read_array" and (name in wanted or active):
+                steps.append(("read_array" if wanted.pop(name, None) else "skip_array", target, argument))
+                if not isinstance(argument, int):
+                    wanted.setdefault(argument[0], set()).add(argument[1])
+            else:
+                continue
+            active = True
+        plan = []
+        for step in reversed(steps):
+            if step[0] == "skip" and not step[1]:
+                continue
+            if step[0] == "skip" and plan and plan[-1][0] == "skip":
+                plan[-1] = ("skip", plan[-1][1] + step[1], None)
+            elif step[0] == "goto" and plan and plan[-1][0] == "skip":
+                plan[-1] = step
+            else:
+                plan.append(step)
+        while plan and plan[-1][0] in ("skip", "skip_array"):
+            plan.pop()
+        return plan
+
+    def run(self, stream, fields, eager=False):
+        result = Result()
+        for step in self.plan(fields):
+            self.execute(stream, result, step, eager)
+        return result
+
+    async def run_async(self, stream, fields, eager=False):
+        result = Result()
+        for step in self.plan(fields):
+            await self.execute_async(stream, result, step, eager)
+        return result
+
+    def execute(self, stream, result, step, eager):
+        kind, target, argument = step
+        if kind == "read":
+            setattr(result, target.__name__, target.from_projection(stream.read(argument.struct.size), argument, eager))
+        elif kind == "skip":
+            stream.seek(target, 1)
+        elif kind == "goto":
+            stream.seek(int(getattr(getattr(result, target), argument)), 0)
+        else:
+            count = argument if isinstance(argument, int) else int(getattr(getattr(result, argument[0]), argument[1]))
+            if kind == "read_array":
+                setattr(result, target.__name__, target.read_array(stream, count))
+            else:
+                stream.seek(target.__struct__.size * count, 1)
+
+    async def execute_async(self, stream, result, step, eager):
+        kind, target, argument = step
+        if kind == "read":
+            setattr(result, target.__name__, target.from_projection(await stream.read(argument.struct.size), argument, eager))
+        elif kind == "skip":
+            await stream.seek(target, 1)
+        elif kind == "goto":
+            await stream.seek(int(getattr(getattr(result, target), argument)), 0)
+        else:
+            count = argument if isinstance(argument, int) else int(getattr(getattr(result, argument[0]), argument[1]))
+            if kind == "read_array":
+                setattr(result, target.__name__, await target.read_array_async(stream, count))
+            else:
+                await stream.seek(target.__struct__.size * count, 1)
+
+    @staticmethod
+    def label(step):
+        kind, target, argument = step
+        if kind == "skip":
+            return "plan: skip"
+        if kind == "goto":
+            return f"plan: goto {target}.{argument}"
+        return f"plan: {kind} {target.__name__}"
@@ -0,0 +1,410 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import argparse, csv, hashlib, importlib.util, json, os, sqlite3, sys, zipfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def load_format(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    if directory in sys.path:
+        sys.path.remove(directory)
+    sys.path.insert(0, directory)
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def iter_paths(paths, archives=False):
+    for path in iter_files(paths):
+        if not archives or not zipfile.is_zipfile(path):
+            yield path
+            continue
+        with open(path, "rb") as doc:
+            if doc.read(4) != b"PK\x03\x04":
+                yield path
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield f"{path}::{info.filename}"
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def columns(module, leading=("path", "error")):
+    result = list(leading)
+    for name, reader in vars(module.READERS).items():
+        if isinstance(reader, type) and issubclass(reader, module.Reader):
+            result.extend(f"{name}.{field}" for field in reader.__members__)
+    return result
+
+
+def flatten_reader(reader, raw):
+    if raw:
+        yield from zip(type(reader).__members__, reader.to_tuple())
+        return
+    for field in type(reader).__members__:
+        yield field, repr(getattr(reader, field))
+
+
+def flatten(module, result, raw=False):
+    record = {}
+    for name, reader in vars(result).items():
+        if isinstance(reader, module.ReaderArray):
+            record[name] = [dict(flatten_reader(item, raw)) for item in reader]
+        else:
+            for field, value in flatten_reader(reader, raw):
+                record[f"{name}.{field}"] = value
+    return record
+
+
+_module = None
+_raw = False
+
+def _init_worker(format_path, raw):
+    global _module, _raw
+    _module = load_format(format_path)
+    _raw = raw
+
+def _scan_chunk(paths):
+    records = []
+    for path in paths:
+        try:
+            record = {"path": path, **flatten(_module, _module.parse(path), _raw)}
+            cacheable = True
+        except Exception as error:
+            record = {"path": path, "error": f"{type(error).__name__}: {error}"}
+            cacheable = not isinstance(error, OSError)
+        records.append((record, cacheable))
+    return records
+
+
+def decode_record(module, record):
+    result = {}
+    for key, value in record.items():
+        reader_name, _, field = key.partition(".")
+        reader = getattr(module.READERS, reader_name, None)
+        if reader is None:
+            result[key] = value
+        elif field:
+            rule = getattr(reader, field)
+            result[key] = str(rule.as_rule(rule, value))
+        else:
+            result[key] = [{field: str(getattr(reader, field).as_rule(getattr(reader, field), item)) for field, item in element.items()} for element in value]
+    return result
+
+
+def format_hash(format_path):
+    with open(format_path, "rb") as doc:
+        return hashlib.sha256(doc.read()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path, format_hash, max_size=None, commit_every=1000):
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, inode INTEGER, format TEXT, record TEXT, used INTEGER)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self.db.execute("DELETE FROM results WHERE format != ?", (format_hash,))
+        self.format_hash = format_hash
+        self.max_size = max_size
+        self.commit_every = commit_every
+        self.clock = self.db.execute("SELECT COALESCE(MAX(used), 0) FROM results").fetchone()[0]
+        self.changes = 0
+
+    def identity(self, path):
+        stat = os.stat(path.partition("::")[0])
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def get(self, path):
+        try:
+            identity = self.identity(path)
+        except OSError:
+            return None, None
+        key = os.path.abspath(path)
+        row = self.db.execute("SELECT record FROM results WHERE path = ? AND size = ? AND mtime = ? AND inode = ?", (key, *identity)).fetchone()
+        if row is None:
+            return None, identity
+        self.clock += 1
+        self.db.execute("UPDATE results SET used = ? WHERE path = ?", (self.clock, key))
+        self.changed()
+        return {**json.loads(row[0]), "path": path}, identity
+
+    def put(self, path, identity, record):
+        self.clock += 1
+        self.db.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(path), *identity, self.format_hash, json.dumps(record), self.clock),
+        )
+        self.changed()
+
+    def changed(self):
+        self.changes += 1
+        if self.changes >= self.commit_every:
+            self.db.commit()
+            self.changes = 0
+
+    def evict(self):
+        if self.max_size is None:
+            return
+        total = self.db.execute("SELECT COALESCE(SUM(LENGTH(record)), 0) FROM results").fetchone()[0]
+        evicted = []
+        for path, size in self.db.execute("SELECT path, LENGTH(record) FROM results ORDER BY used"):
+            if total <= self.max_size:
+                break
+            evicted.append((path,))
+            total -= size
+        self.db.executemany("DELETE FROM results WHERE path = ?", evicted)
+
+    def close(self):
+        self.evict()
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def scan(format_path, paths, jobs=None, chunksize=64, raw=False, cache=None, archives=False):
+    jobs = jobs or os.cpu_count() or 1
+    module = load_format(format_path) if cache is not None and not raw else None
+    identities = {}
+
+    def finish(done):
+        for future in done:
+            chunk_identities = identities.pop(future, None)
+            for index, (record, cacheable) in enumerate(future.result()):
+                if chunk_identities is not None and chunk_identities[index] is not None and cacheable:
+                    cache.put(record["path"], chunk_identities[index], record)
+                yield record if module is None else decode_record(module, record)
+
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(format_path, raw or cache is not None)) as pool:
+        pending = set()
+        for chunk in iter_chunks(iter_paths(paths, archives), chunksize):
+            chunk_identities = None
+            if cache is not None:
+                misses = []
+                chunk_identities = []
+                for path in chunk:
+                    record, identity = cache.get(path)
+                    if record is not None:
+                        yield record if module is None else decode_record(module, record)
+                    else:
+                        misses.append(path)
+                        chunk_identities.append(identity)
+                chunk = misses
+                if not chunk:
+                    continue
+            future = pool.submit(_scan_chunk, chunk)
+            identities[future] = chunk_identities
+            pending.add(future)
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finish(done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finish(done)
+
+
+COLUMN_DTYPES = {1: "<u1", 2: "<u2", 3: "<u4", 4: "<u4", 5: "<u8", 6: "<u8", 7: "<u8", 8: "<u8"}
+
+def column_specs(module, fields=None):
+    specs = []
+    for kind, reader, argument in module.PROGRAM.steps:
+        if kind != "read":
+            continue
+        for member in reader.__members__:
+            name = f"{reader.__name__}.{member}"
+            if fields is None or name in fields or reader.__name__ in fields:
+                size = getattr(reader, member).to_read
+                specs.append((name, reader.__name__, member, size, COLUMN_DTYPES.get(size, f"V{size}")))
+    for field in fields or ():
+        if not any(field in (spec[0], spec[1]) for spec in specs):
+            raise ValueError(f"No such field {field}")
+    return specs
+
+
+def decode_tables(module, fields=None):
+    tables = {}
+    for name, reader_name, member, size, dtype in column_specs(module, fields):
+        as_rule = getattr(getattr(module.READERS, reader_name), member).as_rule
+        table = getattr(as_rule, "to_dict", None) or getattr(getattr(as_rule, "__self__", None), "to_dict", None)
+        if table is not None:
+            tables[name] = table()
+    return tables
+
+
+_specs = None
+
+def _init_columns_worker(format_path, fields):
+    global _module, _specs
+    _module = load_format(format_path)
+    _specs = column_specs(_module, fields)
+
+def _columns_chunk(start, paths):
+    ok = numpy.zeros(len(paths), dtype=bool)
+    arrays = {name: numpy.zeros(len(paths), dtype) for name, reader_name, member, size, dtype in _specs}
+    errors = []
+    fields = [name for name, reader_name, member, size, dtype in _specs]
+    for index, path in enumerate(paths):
+        try:
+            result = _module.parse(path, fields=fields)
+            values = []
+            for name, reader_name, member, size, dtype in _specs:
+                value = getattr(getattr(result, reader_name), f"_{member}")
+                values.append(value.to_bytes(size, "little") if dtype[0] == "V" else value)
+        except Exception as error:
+            errors.append((path, f"{type(error).__name__}: {error}"))
+            continue
+        for (name, *_), value in zip(_specs, values):
+            arrays[name][index] = value
+        ok[index] = True
+    return start, ok, arrays, errors
+
+
+def scan_columns(format_path, paths, fields=None, jobs=None, chunksize=256, errors=None, archives=False):
+    if numpy is None:
+        raise RuntimeError("columnar output needs numpy")
+    module = load_format(format_path)
+    specs = column_specs(module, fields)
+    paths = list(iter_paths(paths, archives))
+    columns = {"path": numpy.array(paths, dtype=str), "ok": numpy.zeros(len(paths), dtype=bool)}
+    for name, reader_name, member, size, dtype in specs:
+        columns[name] = numpy.zeros(len(paths), dtype)
+    jobs = jobs or os.cpu_count() or 1
+
+    def collect(done):
+        for future in done:
+            start, ok, arrays, chunk_errors = future.result()
+            columns["ok"][start:start + len(ok)] = ok
+            for name, array in arrays.items():
+                columns[name][start:start + len(array)] = array
+            if errors is not None:
+                errors.extend(chunk_errors)
+
+    with ProcessPoolExecutor(jobs, initializer=_init_columns_worker, initargs=(format_path, fields)) as pool:
+        pending = set()
+        for start in range(0, len(paths), chunksize):
+            pending.add(pool.submit(_columns_chunk, start, paths[start:start + chunksize]))
+            if len(pending) >= 2 * jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    return columns
+
+
+def save_columns(path, columns, tables):
+    tables = {name: {str(key): value for key, value in table.items()} for name, table in tables.items()}
+    numpy.savez(path, __tables__=numpy.array(json.dumps(tables)), **columns)
+
+
+def load_columns(path):
+    with numpy.load(path) as data:
+        columns = {name: data[name] for name in data.files if name != "__tables__"}
+        tables = json.loads(str(data["__tables__"]))
+    tables = {name: {int(key): value for key, value in table.items()} for name, table in tables.items()}
+    return columns, tables
+
+
+class JSONLWriter:
+    def __init__(self, stream, module, leading=None):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record) + "\n")
+
+
+class CSVWriter:
+    def __init__(self, stream, module, leading=("path", "error")):
+        self.writer = csv.DictWriter(stream, columns(module, leading), extrasaction="ignore")
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+
+WRITERS = {"jsonl": JSONLWriter, "csv": CSVWriter}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse many files with a compiled format, in parallel.")
+    parser.add_argument("format", help="compiled format, like out/pe_file_format.py")
+    parser.add_argument("paths", nargs="+", help="files or directories to scan")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-f", "--output-format", choices=[*WRITERS, "npz"], help="jsonl, csv or npz (default: from the output extension, else jsonl)")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: number of cores)")
+    parser.add_argument("--chunksize", type=int, default=64, help="number of files sent to a worker at once")
+    parser.add_argument("--raw", action="store_true", help="write raw integers instead of decoded values")
+    parser.add_argument("--archives", action="store_true", help="scan each member of the zip files instead of the zip files themselves")
+    parser.add_argument("--cache", help="SQLite file remembering the results of unchanged files between scans")
+    parser.add_argument("--cache-size", type=int, help="maximum size of the cached results, in MiB")
+    parser.add_argument("--fields", nargs="+", help="only keep these READER.field or READER columns (npz only)")
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format
+    if output_format is None:
+        extension = os.path.splitext(args.output or "")[1].lstrip(".")
+        output_format = extension if extension in (*WRITERS, "npz") else "jsonl"
+    module = load_format(args.format)
+    if output_format == "npz":
+        if not args.output:
+            parser.error("npz output needs an output file")
+        errors = []
+        columns = scan_columns(args.format, args.paths, args.fields, args.jobs, args.chunksize, errors, args.archives)
+        save_columns(args.output, columns, decode_tables(module, args.fields))
+        for path, error in errors:
+            print(f"{path}: {error}", file=sys.stderr)
+        print(f"{len(columns['path'])} files scanned, {len(errors)} failed", file=sys.stderr)
+        return
+    stream = open(args.output, "w", newline="") if args.output else sys.stdout
+    cache = None
+    if args.cache:
+        max_size = args.cache_size << 20 if args.cache_size is not None else None
+        cache = ResultCache(args.cache, format_hash(args.format), max_size)
+    try:
+        writer = WRITERS[output_format](stream, module)
+        total = failures = 0
+        for record in scan(args.format, args.paths, args.jobs, args.chunksize, args.raw, cache, args.archives):
+            writer.write(record)
+            total += 1
+            if "error" in record:
+                failures += 1
+                print(f"{record['path']}: {record['error']}", file=sys.stderr)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+        if cache is not None:
+            cache.close()
+    print(f"{total} files scanned, {failures} failed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ class Type(Enum):
 
 
 class Token:
+    __slots__ = ("value", "flag")
+
     def __init__(self, value, flag):
         self.value = value
         self.flag = flag
@@ -17,5 +19,8 @@ class Token:
     def __eq__(self, other):
         return self.value == other.value and self.flag == other.flag
 
+    def __hash__(self):
+        return hash((self.value, self.flag))
+
     def __repr__(self):
-        return f"Token({self.value}, {self.flag})"
\ No newline at end of file
+        return f"Token({self.value}, {self.flag})"